@@ -1,20 +1,35 @@
 import argparse
-import json
+import ast
+import errno
+import orjson
 import os
 import pickle
 import re
 import requests
 import shutil
 import signal
+import sqlite3
 import subprocess
 import sys
+import threading
 import time
 import atexit
-import Levenshtein
 
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from rapidfuzz import process, utils
+from rapidfuzz.distance import Levenshtein
+
+try:
+    from pymediainfo import MediaInfo
+
+    has_mediainfo = MediaInfo.can_parse()
+except ImportError:
+    has_mediainfo = False
 
 from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import *
 from enum import Enum
 
@@ -35,29 +50,50 @@ def read_auth_file_or_default():
 auth_key = read_auth_file_or_default()
 auth_header = {"Authorization": f"Bearer {auth_key}"}
 
-re._MAXCACHE = 4096
 re_redact_api_key = re.compile("(?<=api_key=)[^&]+")
 
 
-last_request_time = 0
+class RateLimiter:
+    # allows at most n acquires in any window of per seconds, shared between threads
 
+    def __init__(self, n: int, per: float):
+        self.n = n
+        self.per = per
+        self.times: Deque[float] = deque()
+        self.lock = threading.Lock()
 
-def do_authed_get_and_handle_err(url: str):
-    import time
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+
+                while len(self.times) > 0 and now - self.times[0] >= self.per:
+                    self.times.popleft()
+
+                if len(self.times) < self.n:
+                    self.times.append(now)
+                    return
 
-    global last_request_time
+                wait = self.per - (now - self.times[0])
 
-    if last_request_time > 0:
-        time_since_last_request = time.time() - last_request_time
-        if time_since_last_request < 0.02:
-            time.sleep(0.01)
+            time.sleep(wait)
 
-    last_request_time = time.time()
+
+# tmdb allows ~50 requests per second, stay a bit below that
+TMDB_WORKERS = 8
+rate_limiter = RateLimiter(40, 1.0)
+
+session = requests.Session()
+session.headers.update(auth_header)
+
+
+def do_authed_get_and_handle_err(url: str):
+    rate_limiter.acquire()
 
     print(f"do_authed_get_and_handle_err: {re_redact_api_key.sub('***', url)}")
 
     try:
-        obj = json.loads(requests.get(url, headers=auth_header).content)
+        obj = orjson.loads(session.get(url).content)
 
         if "error" in obj or "errors" in obj:
             return None
@@ -79,7 +115,7 @@ def do_authed_get_and_handle_err(url: str):
     except requests.exceptions.RequestException:
         print("do_authed_get_and_handle_err: request exception", file=sys.stderr)
         return None
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         print("do_authed_get_and_handle_err: could not parse JSON", file=sys.stderr)
         return None
     except:
@@ -87,7 +123,19 @@ def do_authed_get_and_handle_err(url: str):
         return None
 
 
-tmdb_genres: Dict[int, str] = {}
+tmdb_genres: MutableMapping[int, str] = {}
+
+# tmdb reuses a handful of genre combinations, so resolve each one only once
+genre_names_cache: Dict[FrozenSet[int], List[str]] = {}
+
+
+def genre_names(genre_ids: List[int]) -> List[str]:
+    key = frozenset(genre_ids)
+
+    if key not in genre_names_cache:
+        genre_names_cache[key] = [tmdb_genres[genre_id] for genre_id in genre_ids]
+
+    return genre_names_cache[key]
 
 
 def query_all_genres():
@@ -110,13 +158,15 @@ def query_all_genres():
         return
 
     # just merge them together, seems the id's are the same
-    tmdb_genres = {
-        genre["id"]: genre["name"]
-        for genre in [*movie_genres["genres"], *show_genres["genres"]]
-    }
+    tmdb_genres.update(
+        {
+            genre["id"]: genre["name"]
+            for genre in [*movie_genres["genres"], *show_genres["genres"]]
+        }
+    )
 
 
-has_ffprobe = subprocess.run(["which", "ffprobe"], capture_output=True).returncode == 0
+has_ffprobe = shutil.which("ffprobe") is not None
 
 
 def ffprobe_width_and_height(path: Path) -> Optional[Tuple[int, int]]:
@@ -147,6 +197,47 @@ def ffprobe_width_and_height(path: Path) -> Optional[Tuple[int, int]]:
     return int(width), int(height)
 
 
+# (st_dev, st_ino, st_size, st_mtime_ns) -> (width, height). hardlinked copies of a
+# file share one probe, and a replaced or modified file gets a new key
+probe_cache: MutableMapping[Tuple[int, int, int, int], Tuple[int, int]] = {}
+
+
+def probe_width_and_height(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    if key in probe_cache:
+        return probe_cache[key]
+
+    widthheight = None
+
+    # mediainfo reads the container headers in-process, ffprobe needs a fork per file
+    if has_mediainfo:
+        try:
+            media_info = MediaInfo.parse(str(path))
+            video = next(
+                track for track in media_info.tracks if track.track_type == "Video"
+            )
+
+            if video.width is not None and video.height is not None:
+                widthheight = int(video.width), int(video.height)
+        except:
+            pass
+
+    if widthheight is None:
+        widthheight = ffprobe_width_and_height(path)
+
+    # failures are not stored, they may work on the next run (e.g. ffprobe installed)
+    if widthheight is not None:
+        probe_cache[key] = widthheight
+
+    return widthheight
+
+
+@lru_cache(maxsize=None)
 def get_resolution_from_ffprobe(
     widthheight: Optional[Tuple[int, int]]
 ) -> Optional[str]:
@@ -174,10 +265,22 @@ def get_resolution_from_ffprobe(
 no_interact = False
 no_caches = False
 
-tmdb_not_found: Set[str] = set()
+# searches depend on the year as well, so every tmdb cache is keyed on title and year
+TitleKey = Tuple[str, Optional[int]]
+SeasonKey = Tuple[str, Optional[int], Optional[int]]
+
+tmdb_not_found: Set[TitleKey] = set()
+
+re_trailing_year = re.compile(r"\s*[\(\[]\d{4}[\)\]]$")
+
 
+@lru_cache(maxsize=None)
+def canonical_title(title: str) -> str:
+    # "The Office", "the office " and "The Office (2005)" all map to "the office"
+    return re_trailing_year.sub("", " ".join(title.lower().split()))
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class TmdbShow:
     name: str
     id: int
@@ -186,18 +289,20 @@ class TmdbShow:
     first_air_date: str
 
 
-tmdb_show_name_cache: Dict[str, List[TmdbShow]] = {}
+tmdb_show_name_cache: MutableMapping[TitleKey, List[TmdbShow]] = {}
 
 
 def query_show(name: str, year: Optional[int]) -> List[TmdbShow]:
     global tmdb_not_found
     global tmdb_show_name_cache
 
-    if name in tmdb_not_found:
+    key = (canonical_title(name), year)
+
+    if key in tmdb_not_found:
         return []
 
-    if name in tmdb_show_name_cache:
-        return tmdb_show_name_cache[name]
+    if key in tmdb_show_name_cache:
+        return tmdb_show_name_cache[key]
 
     year = f"&first_air_date_year={year:04d}" if year is not None else ""
     url = f"https://api.themoviedb.org/3/search/tv?query={name}{year}&include_adult=true&api_key={auth_key}"
@@ -205,37 +310,40 @@ def query_show(name: str, year: Optional[int]) -> List[TmdbShow]:
     obj = do_authed_get_and_handle_err(url)
 
     if obj is None:
-        tmdb_not_found.add(name)
+        tmdb_not_found.add(key)
         return []
 
     if "results" not in obj:
-        tmdb_not_found.add(name)
+        tmdb_not_found.add(key)
         return []
 
     results = obj["results"]
 
     ret = []
     for result in results:
-        id = result["id"] if "id" in result else None
-        name = result["name"] if "name" in result else None
-        genre_ids = result["genre_ids"] if "genre_ids" in result else None
-        first_air_date = (
-            result["first_air_date"] if "first_air_date" in result else None
-        )
-
-        if id is None or name is None or genre_ids is None or first_air_date is None:
+        id = result.get("id")
+        show_name = result.get("name")
+        genre_ids = result.get("genre_ids")
+        first_air_date = result.get("first_air_date")
+
+        if (
+            id is None
+            or show_name is None
+            or genre_ids is None
+            or first_air_date is None
+        ):
             continue
 
-        genres = [tmdb_genres[genre_id] for genre_id in genre_ids]
+        genres = genre_names(genre_ids)
 
-        ret.append(TmdbShow(name, id, genre_ids, genres, first_air_date))
+        ret.append(TmdbShow(show_name, id, genre_ids, genres, first_air_date))
 
-    tmdb_show_name_cache[name] = ret
+    tmdb_show_name_cache[key] = ret
 
     return ret
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TmdbMovie:
     title: str
     id: int
@@ -244,17 +352,19 @@ class TmdbMovie:
     release_date: str
 
 
-tmdb_movie_name_cache: Dict[str, List[TmdbMovie]] = {}
+tmdb_movie_name_cache: MutableMapping[TitleKey, List[TmdbMovie]] = {}
 
 
 def query_movie(title: str, year: Optional[int]) -> List[TmdbMovie]:
     global tmdb_not_found
 
-    if title in tmdb_not_found:
+    key = (canonical_title(title), year)
+
+    if key in tmdb_not_found:
         return []
 
-    if title in tmdb_movie_name_cache:
-        return tmdb_movie_name_cache[title]
+    if key in tmdb_movie_name_cache:
+        return tmdb_movie_name_cache[key]
 
     year = f"&primary_release_year={year:04d}" if year is not None else ""
     url = f"https://api.themoviedb.org/3/search/movie?query={title}{year}&include_adult=true&api_key={auth_key}"
@@ -262,70 +372,120 @@ def query_movie(title: str, year: Optional[int]) -> List[TmdbMovie]:
     obj = do_authed_get_and_handle_err(url)
 
     if obj is None:
-        tmdb_not_found.add(title)
+        tmdb_not_found.add(key)
         return []
 
     if "results" not in obj:
-        tmdb_not_found.add(title)
+        tmdb_not_found.add(key)
         return []
 
     results = obj["results"]
 
     ret = []
     for result in results:
-        id = result["id"] if "id" in result else None
-        title = result["title"] if "title" in result else None
-        genre_ids = result["genre_ids"] if "genre_ids" in result else None
-        release_date = result["release_date"] if "release_date" in result else None
-
-        if id is None or title is None or genre_ids is None or release_date is None:
+        id = result.get("id")
+        movie_title = result.get("title")
+        genre_ids = result.get("genre_ids")
+        release_date = result.get("release_date")
+
+        if (
+            id is None
+            or movie_title is None
+            or genre_ids is None
+            or release_date is None
+        ):
             continue
 
-        genres = [tmdb_genres[genre_id] for genre_id in genre_ids]
+        genres = genre_names(genre_ids)
 
-        ret.append(TmdbMovie(title, id, genre_ids, genres, release_date))
+        ret.append(TmdbMovie(movie_title, id, genre_ids, genres, release_date))
 
-    tmdb_movie_name_cache[title] = ret
+    tmdb_movie_name_cache[key] = ret
 
     return ret
 
 
-cache_time: Dict[str, int] = {}
+def bulk_query_shows(names_years: Iterable[Tuple[str, Optional[int]]]):
+    # warms tmdb_show_name_cache, so the serial lookups later on never wait on the network
+    with ThreadPoolExecutor(max_workers=TMDB_WORKERS) as executor:
+        list(executor.map(lambda name_year: query_show(*name_year), names_years))
 
 
-def write_caches():
-    if no_caches:
-        return
+def bulk_query_movies(titles_years: Iterable[Tuple[str, Optional[int]]]):
+    with ThreadPoolExecutor(max_workers=TMDB_WORKERS) as executor:
+        list(executor.map(lambda title_year: query_movie(*title_year), titles_years))
 
-    global cache_time
-    global tmdb_genres
-    global tmdb_show_id_cache
-    global tmdb_movie_id_cache
-    global tmdb_details_tv_season_cache
-    global tmdb_details_movie_cache
-    global tmdb_movie_name_cache
-    global tmdb_show_name_cache
 
-    def write_cache(name: str, obj: object, ignore_time=False):
-        if not ignore_time:
-            cache_time[name] = int(time.time())
+CACHE_FILE = "tmdb_cache.sqlite"
+CACHE_TTL = 86400
+
+
+class SqliteCache(MutableMapping):
+    # dict-like view of one table in the cache db, rows older than the ttl
+    # (CACHE_TTL by default, None never expires) are treated as missing.
+    # keys are stored as their repr, values pickled
+
+    def __init__(
+        self, conn: sqlite3.Connection, table: str, ttl: Optional[int] = CACHE_TTL
+    ):
+        self.conn = conn
+        self.table = table
+        self.ttl = ttl if ttl is not None else sys.maxsize
+
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value BLOB, ts INTEGER)"
+        )
+
+    def __getitem__(self, key):
+        row = self.conn.execute(
+            f"SELECT value FROM {self.table} WHERE key = ? AND ? - ts < ?",
+            (repr(key), int(time.time()), self.ttl),
+        ).fetchone()
+
+        if row is None:
+            raise KeyError(key)
+
+        return pickle.loads(row[0])
+
+    def __setitem__(self, key, value):
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, ts) VALUES (?, ?, ?)",
+            (repr(key), pickle.dumps(value), int(time.time())),
+        )
+
+    def __delitem__(self, key):
+        cursor = self.conn.execute(
+            f"DELETE FROM {self.table} WHERE key = ?", (repr(key),)
+        )
+
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        row = self.conn.execute(
+            f"SELECT 1 FROM {self.table} WHERE key = ? AND ? - ts < ?",
+            (repr(key), int(time.time()), self.ttl),
+        ).fetchone()
 
-        with open(name, "wb") as f:
-            pickle.dump(obj, f)
+        return row is not None
 
-    write_cache("all_genres.cache.pickle", tmdb_genres)
-    write_cache("tmdb_show_id.cache.pickle", tmdb_show_id_cache)
-    write_cache("tmdb_movie_id.cache.pickle", tmdb_movie_id_cache)
-    write_cache("tmdb_details_tv_season.cache.pickle", tmdb_details_tv_season_cache)
-    write_cache("tmdb_details_movie.cache.pickle", tmdb_details_movie_cache)
-    write_cache("tmdb_movie_name.cache.pickle", tmdb_movie_name_cache)
-    write_cache("tmdb_show_name.cache.pickle", tmdb_show_name_cache)
+    def __iter__(self):
+        rows = self.conn.execute(
+            f"SELECT key FROM {self.table} WHERE ? - ts < ?",
+            (int(time.time()), self.ttl),
+        ).fetchall()
 
-    write_cache("cache_time.cache.pickle", cache_time, ignore_time=True)
+        for (key,) in rows:
+            yield ast.literal_eval(key)
 
+    def __len__(self):
+        return self.conn.execute(
+            f"SELECT COUNT(*) FROM {self.table} WHERE ? - ts < ?",
+            (int(time.time()), self.ttl),
+        ).fetchone()[0]
 
-def load_caches():
-    global cache_time
+
+def open_caches():
     global tmdb_genres
     global tmdb_show_id_cache
     global tmdb_movie_id_cache
@@ -333,30 +493,52 @@ def load_caches():
     global tmdb_details_movie_cache
     global tmdb_movie_name_cache
     global tmdb_show_name_cache
+    global probe_cache
 
-    def read_cache(name: str, ignore_time=False):
-        if not ignore_time:
-            if name not in cache_time:
-                return {}
+    # autocommit, every write goes straight to disk so nothing is lost on exit
+    # shared with the tmdb worker threads, sqlite serializes access itself
+    conn = sqlite3.connect(CACHE_FILE, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    atexit.register(conn.close)
 
-            if int(time.time()) - cache_time[name] > 86400:
-                return {}
+    tmdb_genres = SqliteCache(conn, "all_genres")
+    tmdb_show_id_cache = SqliteCache(conn, "tmdb_show_id")
+    tmdb_movie_id_cache = SqliteCache(conn, "tmdb_movie_id")
+    tmdb_details_tv_season_cache = SqliteCache(conn, "tmdb_details_tv_season")
+    tmdb_details_movie_cache = SqliteCache(conn, "tmdb_details_movie")
+    tmdb_movie_name_cache = SqliteCache(conn, "tmdb_movie_name")
+    tmdb_show_name_cache = SqliteCache(conn, "tmdb_show_name")
+    # the key changes with the file, so probes never go stale
+    probe_cache = SqliteCache(conn, "probe_width_height", ttl=None)
 
-        try:
-            with open(name, "rb") as f:
-                return pickle.load(f)
-        except:
-            return {}
 
-    cache_time = read_cache("cache_time.cache.pickle", ignore_time=True)
+SUBTITLE_EXTENSIONS = (".srt", ".vtt", ".ass", ".mks")
+
+
+def iter_files(root: str) -> Iterator[os.DirEntry]:
+    # like os.walk, files of a directory come before the ones in its subdirectories,
+    # symlinked dirs are not followed, and unreadable dirs are skipped. the entries
+    # keep the type info from the directory listing, so no extra stat per file
+    try:
+        scandir_it = os.scandir(root)
+    except OSError:
+        return
+
+    dirs = []
+    with scandir_it:
+        for entry in scandir_it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
 
-    tmdb_genres = read_cache("all_genres.cache.pickle")
-    tmdb_show_id_cache = read_cache("tmdb_show_id.cache.pickle")
-    tmdb_movie_id_cache = read_cache("tmdb_movie_id.cache.pickle")
-    tmdb_details_tv_season_cache = read_cache("tmdb_details_tv_season.cache.pickle")
-    tmdb_details_movie_cache = read_cache("tmdb_details_movie.cache.pickle")
-    tmdb_movie_name_cache = read_cache("tmdb_movie_name.cache.pickle")
-    tmdb_show_name_cache = read_cache("tmdb_show_name.cache.pickle")
+            if not is_dir:
+                yield entry
+            elif not entry.is_symlink():
+                dirs.append(entry.path)
+
+    for dir in dirs:
+        yield from iter_files(dir)
 
 
 class MediaType(Enum):
@@ -382,7 +564,7 @@ class FeaturetteTag(Enum):
     EXTRA = "Extra"
 
 
-@dataclass
+@dataclass(slots=True)
 class Show:
     media_type: MediaType = MediaType.SHOW
     title: Optional[str] = None
@@ -401,18 +583,84 @@ class Show:
 
 
 remove_parts: List[str] = []
+re_remove_parts: Optional[re.Pattern] = None
+# same words for subtitle names, those are lowercased before matching
+re_remove_sub_parts: Optional[re.Pattern] = None
 
+# separators become a single space, anything else not in the whitelist is dropped
+re_clean_part = re.compile(r"([._\s]+)|[^a-zA-Z0-9åäöũỹẽß\s\(\)\[\]\-._]+")
+re_whitespace = re.compile(r"\s+")
+re_subpart = re.compile(r"\b-\b")
 
-def parse_show_or_movie_path(path: Path, media_type: MediaType) -> Optional[Show]:
+# single characters, str.translate does these without going through re
+sub_separators_table = str.maketrans(".-_,;:", "      ")
+illegal_path_chars_table = str.maketrans("", "", ':*?"<>|')
+
+re_featurette = re.compile(r"featurettes?", re.IGNORECASE)
+re_sample = re.compile(r"sample", re.IGNORECASE)
+re_year = re.compile(r"[\[\(]?\d{4}[^p][\]\)]?")
+re_season_episode_range = re.compile(r"S\d+E\d+\-E\d+", re.IGNORECASE)
+re_season_episode = re.compile(r"S\d+E\d+", re.IGNORECASE)
+re_season = re.compile(r"season \d+", re.IGNORECASE)
+re_resolution = re.compile(r"8k|4k|4320p|2160p|1080p|720p|480p", re.IGNORECASE)
+
+featurette_tag_patterns: List[Tuple[re.Pattern, FeaturetteTag]] = [
+    (re.compile(r"behind the", re.IGNORECASE), FeaturetteTag.BEHIND_THE_SCENES),
+    (re.compile(r"interview", re.IGNORECASE), FeaturetteTag.INTERVIEW),
+    (re.compile(r"making of", re.IGNORECASE), FeaturetteTag.MAKING_OF),
+    (re.compile(r"promo", re.IGNORECASE), FeaturetteTag.PROMO),
+    (re.compile(r"trailer", re.IGNORECASE), FeaturetteTag.TRAILER),
+    (re.compile(r"teaser", re.IGNORECASE), FeaturetteTag.TEASER),
+    (re.compile(r"webisode", re.IGNORECASE), FeaturetteTag.WEBISODE),
+    (re.compile(r"deleted scene", re.IGNORECASE), FeaturetteTag.DELETED_SCENE),
+    (re.compile(r"extra", re.IGNORECASE), FeaturetteTag.EXTRA),
+]
+
+
+def clean_part_replacement(match: re.Match) -> str:
+    return "" if match.group(1) is None else " "
+
+
+def exec_regex(regex: re.Pattern, s: str) -> Tuple[str, Optional[str]]:
+    match = regex.search(s)
+    if match is None:
+        return s, None
+
+    s = re_whitespace.sub(" ", s[: match.start()] + s[match.end() :])
+
+    return s, match.group(0)
+
+
+def load_remove_parts():
     global remove_parts
+    global re_remove_parts
+    global re_remove_sub_parts
+
+    if len(remove_parts) > 0:
+        return
+
+    try:
+        with open("extra_disallowed.txt", "r") as f:
+            remove_parts = f.read().split("\n")
+    except:
+        return
+
+    # one alternation for all of them, instead of a pattern per word
+    words = [re.escape(word) for word in remove_parts if word != ""]
+    if len(words) > 0:
+        re_remove_parts = re.compile(r"\b(?:" + "|".join(words) + r")\b", re.IGNORECASE)
+
+        words = [re.escape(word.lower()) for word in remove_parts if word != ""]
+        re_remove_sub_parts = re.compile(r"\b(?:" + "|".join(words) + r")\b")
 
+
+def parse_show_or_movie_path(path: Path, media_type: MediaType) -> Optional[Show]:
     show = Show()
     show.media_type = media_type
     show.show_type = ShowType.SHOW
     show.fullpath = str(path)
 
     extension = path.suffix[1:]
-    path: str = str(path)[: -len(extension)]
 
     show.extension = extension
 
@@ -430,41 +678,22 @@ def parse_show_or_movie_path(path: Path, media_type: MediaType) -> Optional[Show
     ]:
         return None
 
-    def replace_separators_with_spaces(s: str) -> str:
-        return re.sub(r"[._\s]+", " ", s)
-
-    def remove_disallowed_chars(s: str) -> str:
-        return re.sub(r"[^a-zA-Z0-9åäöũỹẽß\s\(\)\[\]\-]", "", s)
-
-    def exec_regex(regex: re.Pattern, s: str) -> Tuple[str, Optional[str]]:
-        match = regex.search(s)
-        if match is None:
-            return s, None
-
-        s = re.compile(r"\s+").sub(" ", s[: match.start()] + s[match.end() :])
-
-        return s, match.group(0)
-
-    if len(remove_parts) == 0:
-        try:
-            with open("extra_disallowed.txt", "r") as f:
-                remove_parts = f.read().split("\n")
-        except:
-            pass
+    load_remove_parts()
 
     removed_parts = []
 
-    parts = path.split("/")
+    # the stem keeps the "." before the extension, the year and removed parts
+    # rely on the trailing separator
+    parts = [*path.parts[:-1], path.stem + "."]
 
     first = True
 
     while len(parts) > 0:
         part = parts.pop(0)
 
-        part = replace_separators_with_spaces(part)
-        part = remove_disallowed_chars(part)
+        part = re_clean_part.sub(clean_part_replacement, part)
 
-        subparts = re.compile(r"\b-\b").split(part)
+        subparts = re_subpart.split(part)
         if len(subparts) > 1:
             parts = subparts + parts
             continue
@@ -472,26 +701,26 @@ def parse_show_or_movie_path(path: Path, media_type: MediaType) -> Optional[Show
         for removed_part in removed_parts:
             part = part.replace(removed_part, "")
 
-        for disallowed in remove_parts:
-            part = re.compile(r"\b" + disallowed + r"\b", re.IGNORECASE).sub("", part)
+        if re_remove_parts is not None:
+            part = re_remove_parts.sub("", part)
 
         if part == "":
             continue
 
-        part, featurette = exec_regex(re.compile(r"featurettes?", re.IGNORECASE), part)
+        part, featurette = exec_regex(re_featurette, part)
 
         if featurette is not None:
             show.show_type = ShowType.FEATURETTE
             removed_parts.append(featurette)
 
-        part, sample = exec_regex(re.compile(r"sample", re.IGNORECASE), part)
+        part, sample = exec_regex(re_sample, part)
 
         if sample is not None:
             show.show_type = ShowType.SAMPLE
             removed_parts.append(sample)
 
         if show.year is None:
-            part, year = exec_regex(re.compile(r"[\[\(]?\d{4}[^p][\]\)]?"), part)
+            part, year = exec_regex(re_year, part)
             if year is not None:
                 removed_parts.append(year)
                 try:
@@ -500,9 +729,7 @@ def parse_show_or_movie_path(path: Path, media_type: MediaType) -> Optional[Show
                     pass
 
         if show.season is None or show.episode is None:
-            part, season_episode_episode_end = exec_regex(
-                re.compile(r"S\d+E\d+\-E\d+", re.IGNORECASE), part
-            )
+            part, season_episode_episode_end = exec_regex(re_season_episode_range, part)
             if season_episode_episode_end is not None:
                 removed_parts.append(season_episode_episode_end)
                 try:
@@ -518,9 +745,7 @@ def parse_show_or_movie_path(path: Path, media_type: MediaType) -> Optional[Show
                     pass
 
         if show.season is None or show.episode is None:
-            part, season_episode = exec_regex(
-                re.compile(r"S\d+E\d+", re.IGNORECASE), part
-            )
+            part, season_episode = exec_regex(re_season_episode, part)
 
             if season_episode is not None:
                 removed_parts.append(season_episode)
@@ -533,7 +758,7 @@ def parse_show_or_movie_path(path: Path, media_type: MediaType) -> Optional[Show
                     pass
 
         if show.season is None:
-            part, season = exec_regex(re.compile(r"season \d+", re.IGNORECASE), part)
+            part, season = exec_regex(re_season, part)
 
             if season is not None:
                 removed_parts.append(season)
@@ -543,9 +768,7 @@ def parse_show_or_movie_path(path: Path, media_type: MediaType) -> Optional[Show
                     pass
 
         if show.resolution is None:
-            part, resolution = exec_regex(
-                re.compile(r"8k|4k|4320p|2160p|1080p|720p|480p", re.IGNORECASE), part
-            )
+            part, resolution = exec_regex(re_resolution, part)
 
         if resolution is not None:
             removed_parts.append(resolution)
@@ -559,7 +782,8 @@ def parse_show_or_movie_path(path: Path, media_type: MediaType) -> Optional[Show
         if first:
             first = False
             # removed_parts.append(part) # not adding this since its the show name, and sometimes an episode is called the same
-            show.title = part.strip()
+            # interned, the title is the key for every cache lookup later on
+            show.title = sys.intern(part.strip())
             continue
 
         if len(parts) == 0:
@@ -569,78 +793,92 @@ def parse_show_or_movie_path(path: Path, media_type: MediaType) -> Optional[Show
 
                 show.name = name.strip()
             else:
-                found = False
-                for disallowed in remove_parts:
-                    if (
-                        re.compile(r"\b" + disallowed + r"\b", re.IGNORECASE).match(
-                            part
-                        )
-                        is not None
-                    ):
-                        found = True
-                        break
+                found = (
+                    re_remove_parts is not None
+                    and re_remove_parts.match(part) is not None
+                )
 
                 if not found:
                     show.name = part.strip()
 
     if show.show_type == ShowType.FEATURETTE:
-        _, tag = exec_regex(re.compile(r"behind the", re.IGNORECASE), path)
-        if tag is not None:
-            show.featurette_tags.append(FeaturetteTag.BEHIND_THE_SCENES)
+        for regex, featurette_tag in featurette_tag_patterns:
+            _, tag = exec_regex(regex, show.fullpath)
+            if tag is not None:
+                show.featurette_tags.append(featurette_tag)
+
+    return show
 
-        _, tag = exec_regex(re.compile(r"interview", re.IGNORECASE), path)
-        if tag is not None:
-            show.featurette_tags.append(FeaturetteTag.INTERVIEW)
 
-        _, tag = exec_regex(re.compile(r"making of", re.IGNORECASE), path)
-        if tag is not None:
-            show.featurette_tags.append(FeaturetteTag.MAKING_OF)
+tmdb_show_id_cache: MutableMapping[TitleKey, int] = {}
+tmdb_movie_id_cache: MutableMapping[TitleKey, int] = {}
 
-        _, tag = exec_regex(re.compile(r"promo", re.IGNORECASE), path)
-        if tag is not None:
-            show.featurette_tags.append(FeaturetteTag.PROMO)
+# a season holds all of its episodes, so one entry covers every file in it
+tmdb_details_tv_season_cache: MutableMapping[SeasonKey, object] = {}
+tmdb_details_movie_cache: MutableMapping[TitleKey, object] = {}
 
-        _, tag = exec_regex(re.compile(r"trailer", re.IGNORECASE), path)
-        if tag is not None:
-            show.featurette_tags.append(FeaturetteTag.TRAILER)
 
-        _, tag = exec_regex(re.compile(r"teaser", re.IGNORECASE), path)
-        if tag is not None:
-            show.featurette_tags.append(FeaturetteTag.TEASER)
+def trigrams(s: str) -> Set[str]:
+    s = f"  {s}  "
+    return {s[i : i + 3] for i in range(len(s) - 2)}
 
-        _, tag = exec_regex(re.compile(r"webisode", re.IGNORECASE), path)
-        if tag is not None:
-            show.featurette_tags.append(FeaturetteTag.WEBISODE)
 
-        _, tag = exec_regex(re.compile(r"deleted scene", re.IGNORECASE), path)
-        if tag is not None:
-            show.featurette_tags.append(FeaturetteTag.DELETED_SCENE)
+def best_match(query: str, titles: List[str]) -> Optional[int]:
+    # index of the title closest to the query, or None if nothing is close enough
+    query = utils.default_process(query)
+    query_trigrams = trigrams(query)
+    threshold = max(2, len(query) // 4)
 
-        _, tag = exec_regex(re.compile(r"extra", re.IGNORECASE), path)
-        if tag is not None:
-            show.featurette_tags.append(FeaturetteTag.EXTRA)
+    candidates = {}
+    for i, title in enumerate(titles):
+        title = utils.default_process(title)
+        if abs(len(title) - len(query)) > threshold:
+            continue
 
-    return show
+        # cheap set overlap first, only titles sharing enough trigrams get ranked
+        title_trigrams = trigrams(title)
+        overlap = len(query_trigrams & title_trigrams)
+        if overlap / len(query_trigrams | title_trigrams) < 0.3:
+            continue
 
+        candidates[i] = title
 
-tmdb_show_id_cache: Dict[str, int] = {}
-tmdb_movie_id_cache: Dict[str, int] = {}
+    match = process.extractOne(
+        query,
+        candidates,
+        scorer=Levenshtein.normalized_similarity,
+        processor=None,
+        score_cutoff=0.6,
+    )
+
+    if match is None:
+        return None
 
-tmdb_details_tv_season_cache: Dict[str, object] = {}
-tmdb_details_movie_cache: Dict[str, object] = {}
+    return match[2]
 
 
 def query_tmdb_id(show: Show) -> Optional[int]:
     global tmdb_show_id_cache
+    global tmdb_movie_id_cache
     global tmdb_not_found
 
-    if show.title in tmdb_show_id_cache:
-        return tmdb_show_id_cache[show.title]
+    if show.title is None:
+        return None
 
-    if show.media_type == MediaType.SHOW:
-        if show.title in tmdb_not_found:
-            return None
+    key = (canonical_title(show.title), show.year)
+
+    if key in tmdb_not_found:
+        return None
+
+    id_cache = (
+        tmdb_show_id_cache if show.media_type == MediaType.SHOW else tmdb_movie_id_cache
+    )
+
+    if key in id_cache:
+        id = id_cache[key]
+        return id if id != -1 else None
 
+    if show.media_type == MediaType.SHOW:
         tmdb_shows = query_show(show.title, show.year)
 
         if len(tmdb_shows) == 0:
@@ -656,12 +894,17 @@ def query_tmdb_id(show: Show) -> Optional[int]:
                 id = tmdb_movie.id
                 found += 1
 
-        if no_interact and len(tmdb_shows) > 1:
-            print("no interact: selecting first movie")
-            id = tmdb_shows[0].id
-            found = 0
+        # a single year match is taken as is, the same as without --no-interact
+        if no_interact and found != 1 and len(tmdb_shows) > 1:
+            match = best_match(show.title, [t.name for t in tmdb_shows])
+            if match is None:
+                print("no interact: selecting first show")
+                match = 0
+            else:
+                print(f"no interact: selecting closest show {tmdb_shows[match].name}")
+            id = tmdb_shows[match].id
 
-        if (id == -1 or found > 1) and len(tmdb_shows) > 1:
+        elif (id == -1 or found > 1) and len(tmdb_shows) > 1:
             print(f"Multiple shows found for {show.title} ({show.year})")
             print("Please select one of the following:")
             for i, tmdb_movie in enumerate(tmdb_shows):
@@ -679,15 +922,12 @@ def query_tmdb_id(show: Show) -> Optional[int]:
                 except ValueError:
                     print("Invalid selection")
 
-        else:
+        elif id == -1:
             id = tmdb_shows[0].id
 
-        tmdb_show_id_cache[show.title] = id
+        tmdb_show_id_cache[key] = id
 
     else:
-        if show.title in tmdb_not_found:
-            return None
-
         tmdb_movies = query_movie(show.title, show.year)
 
         if len(tmdb_movies) == 0:
@@ -701,12 +941,19 @@ def query_tmdb_id(show: Show) -> Optional[int]:
                 id = tmdb_movie.id
                 found += 1
 
-        if no_interact and len(tmdb_movies) > 1:
-            print("no interact: selecting first movie")
-            id = tmdb_movies[0].id
-            found = 0
+        # a single year match is taken as is, the same as without --no-interact
+        if no_interact and found != 1 and len(tmdb_movies) > 1:
+            match = best_match(show.title, [t.title for t in tmdb_movies])
+            if match is None:
+                print("no interact: selecting first movie")
+                match = 0
+            else:
+                print(
+                    f"no interact: selecting closest movie {tmdb_movies[match].title}"
+                )
+            id = tmdb_movies[match].id
 
-        if (id == -1 or found > 1) and len(tmdb_movies) > 1:
+        elif (id == -1 or found > 1) and len(tmdb_movies) > 1:
             print(f"Multiple movies found for {show.title} ({show.year})")
             print("Please select one of the following:")
             for i, tmdb_movie in enumerate(tmdb_movies):
@@ -724,10 +971,10 @@ def query_tmdb_id(show: Show) -> Optional[int]:
                 except ValueError:
                     print("Invalid selection")
 
-        else:
+        elif id == -1:
             id = tmdb_movies[0].id
 
-        tmdb_movie_id_cache[show.title] = id
+        tmdb_movie_id_cache[key] = id
 
     if id == -1:
         return None
@@ -740,16 +987,16 @@ def query_tmdb_details(show: Show) -> Optional[object]:
     global tmdb_details_movie_cache
     global tmdb_not_found
 
-    if show.media_type == MediaType.SHOW:
-        key = ""
+    if show.title is None:
+        return None
 
-        if show.season is None:
-            key = f"{show.title} noseason"
-        else:
-            key = f"{show.title} S{show.season}"
+    title_key = (canonical_title(show.title), show.year)
 
-        if show.title in tmdb_not_found:
-            return None
+    if title_key in tmdb_not_found:
+        return None
+
+    if show.media_type == MediaType.SHOW:
+        key = (*title_key, show.season)
 
         if key in tmdb_details_tv_season_cache:
             return tmdb_details_tv_season_cache[key]
@@ -759,40 +1006,36 @@ def query_tmdb_details(show: Show) -> Optional[object]:
         if show_id is None:
             return None
 
-        show_obj = do_authed_get_and_handle_err(
-            f"https://api.themoviedb.org/3/tv/{show_id}?api_key={auth_key}"
-        )
+        url = f"https://api.themoviedb.org/3/tv/{show_id}?api_key={auth_key}"
 
-        season_obj: object = None
+        # fetch the season in the same request as the show
+        if show.season is not None:
+            url += f"&append_to_response=season/{show.season}"
 
-        if show.season is None:
-            season_obj = do_authed_get_and_handle_err(
-                f"https://api.themoviedb.org/3/tv/{show_id}/season/{show.season}?api_key={auth_key}"
-            )
-        else:
-            season_obj = do_authed_get_and_handle_err(
-                f"https://api.themoviedb.org/3/tv/{show_id}/season/{show.season}?api_key={auth_key}"
-            )
+        show_obj = do_authed_get_and_handle_err(url)
 
-        if season_obj is None:
-            tmdb_not_found.add(show.title)
+        if show_obj is None:
+            tmdb_not_found.add(title_key)
             return None
 
-        if show_obj is not None and "first_air_date" in show_obj:
+        season_obj: object = {}
+
+        # no season means no episode either, the show info is all thats needed
+        if show.season is not None and f"season/{show.season}" in show_obj:
+            season_obj = show_obj[f"season/{show.season}"]
+
+        if "first_air_date" in show_obj:
             season_obj["first_air_date"] = show_obj["first_air_date"]
 
-        if show_obj is not None and "id" in show_obj:
+        if "id" in show_obj:
             season_obj["show_id"] = show_obj["id"]
 
         tmdb_details_tv_season_cache[key] = season_obj
 
         return season_obj
     else:
-        if show.title in tmdb_details_movie_cache:
-            return tmdb_details_movie_cache[show.title]
-
-        if show.title in tmdb_not_found:
-            return None
+        if title_key in tmdb_details_movie_cache:
+            return tmdb_details_movie_cache[title_key]
 
         movie_id = query_tmdb_id(show)
 
@@ -804,203 +1047,295 @@ def query_tmdb_details(show: Show) -> Optional[object]:
         )
 
         if movie_obj is None:
-            tmdb_not_found.add(show.title)
+            tmdb_not_found.add(title_key)
             return None
 
-        tmdb_details_movie_cache[show.title] = movie_obj
+        tmdb_details_movie_cache[title_key] = movie_obj
 
         return movie_obj
 
 
-LANGUAGES: Dict[str, List[str]] = {
+def bulk_query_details(shows: List[Show]):
+    # ids have to be resolved already, query_tmdb_id could prompt otherwise
+    unique: Dict[SeasonKey, Show] = {}
+    for show in shows:
+        if show.title is None:
+            continue
+
+        season = show.season if show.media_type == MediaType.SHOW else None
+        unique.setdefault((canonical_title(show.title), show.year, season), show)
+
+    with ThreadPoolExecutor(max_workers=TMDB_WORKERS) as executor:
+        list(executor.map(query_tmdb_details, unique.values()))
+
+
+LANGUAGES: Dict[str, Tuple[str, ...]] = {
     # iso639 language codes, set 1, 2/t, 2/b, 3
-    "abkhazian": ["ab", "abk", "abk", "abk"],
-    "afar": ["aa", "aar", "aar", "aar"],
-    "afrikaans": ["af", "afr", "afr", "afr"],
-    "akan": ["ak", "aka", "aka", "aka"],
-    "albanian": ["sq", "sqi", "alb", "sqi"],
-    "amharic": ["am", "amh", "amh", "amh"],
-    "arabic": ["ar", "ara", "ara", "ara"],
-    "aragonese": ["an", "arg", "arg", "arg"],
-    "armenian": ["hy", "hye", "arm", "hye"],
-    "assamese": ["as", "asm", "asm", "asm"],
-    "avaric": ["av", "ava", "ava", "ava"],
-    "avestan": ["ae", "ave", "ave", "ave"],
-    "aymara": ["ay", "aym", "aym", "aym"],
-    "azerbaijani": ["az", "aze", "aze", "aze"],
-    "bambara": ["bm", "bam", "bam", "bam"],
-    "bashkir": ["ba", "bak", "bak", "bak"],
-    "basque": ["eu", "eus", "baq", "eus"],
-    "belarusian": ["be", "bel", "bel", "bel"],
-    "bengali": ["bn", "ben", "ben", "ben"],
-    "bislama": ["bi", "bis", "bis", "bis"],
-    "bosnian": ["bs", "bos", "bos", "bos"],
-    "breton": ["br", "bre", "bre", "bre"],
-    "bulgarian": ["bg", "bul", "bul", "bul"],
-    "burmese": ["my", "mya", "bur", "mya"],
-    "cambodian": ["K", "kuyu", "ki", "kik"],
-    "catalan": ["ca", "cat", "cat", "cat"],
-    "centralKhmer": ["km", "khm", "khm", "khm"],
-    "chamorro": ["ch", "cha", "cha", "cha"],
-    "chechen": ["ce", "che", "che", "che"],
-    "chichewa": ["ny", "nya", "nya", "nya"],
-    "chinese": ["zh", "zho", "chi", "zho"],
-    "churchSlavonic": ["cu", "chu", "chu", "chu"],
-    "chuvash": ["cv", "chv", "chv", "chv"],
-    "cornish": ["kw", "cor", "cor", "cor"],
-    "corsican": ["co", "cos", "cos", "cos"],
-    "cree": ["cr", "cre", "cre", "cre"],
-    "croatian": ["hr", "hrv", "hrv", "hrv"],
-    "czech": ["cs", "ces", "cze", "ces"],
-    "danish": ["da", "dan", "dan", "dan"],
-    "divehi": ["dv", "div", "div", "div"],
-    "dutch": ["nl", "nld", "dut", "nld"],
-    "dzongkha": ["dz", "dzo", "dzo", "dzo"],
-    "english": ["en", "eng", "eng", "eng"],
-    "esperanto": ["eo", "epo", "epo", "epo"],
-    "estonian": ["et", "est", "est", "est"],
-    "ewe": ["ee", "ewe", "ewe", "ewe"],
-    "faroese": ["fo", "fao", "fao", "fao"],
-    "fijian": ["fj", "fij", "fij", "fij"],
-    "finnish": ["fi", "fin", "fin", "fin"],
-    "french": ["fr", "fra", "fre", "fra"],
-    "fulah": ["ff", "ful", "ful", "ful"],
-    "gaelic": ["gd", "gla", "gla", "gla"],
-    "galician": ["gl", "glg", "glg", "glg"],
-    "ganda": ["lg", "lug", "lug", "lug"],
-    "georgian": ["ka", "kat", "geo", "kat"],
-    "german": ["de", "deu", "ger", "deu"],
-    "greek": ["el", "ell", "gre", "ell"],
-    "guarani": ["gn", "grn", "grn", "grn"],
-    "gujarati": ["gu", "guj", "guj", "guj"],
-    "haitian": ["ht", "hat", "hat", "hat"],
-    "hausa": ["ha", "hau", "hau", "hau"],
-    "hebrew": ["he", "heb", "heb", "heb"],
-    "herero": ["hz", "her", "her", "her"],
-    "hindi": ["hi", "hin", "hin", "hin"],
-    "hiriMotu": ["ho", "hmo", "hmo", "hmo"],
-    "hungarian": ["hu", "hun", "hun", "hun"],
-    "icelandic": ["is", "isl", "ice", "isl"],
-    "ido": ["io", "ido", "ido", "ido"],
-    "igbo": ["ig", "ibo", "ibo", "ibo"],
-    "indonesian": ["id", "ind", "ind", "ind"],
-    "interlingua": ["ia", "ina", "ina", "ina"],
-    "interlingue": ["ie", "ile", "ile", "ile"],
-    "inuktitut": ["iu", "iku", "iku", "iku"],
-    "inupiaq": ["ik", "ipk", "ipk", "ipk"],
-    "irish": ["ga", "gle", "gle", "gle"],
-    "italian": ["it", "ita", "ita", "ita"],
-    "japanese": ["ja", "jpn", "jpn", "jpn"],
-    "javanese": ["jv", "jav", "jav", "jav"],
-    "kalaallisut": ["kl", "kal", "kal", "kal"],
-    "kannada": ["kn", "kan", "kan", "kan"],
-    "kanuri": ["kr", "kau", "kau", "kau"],
-    "kashmiri": ["ks", "kas", "kas", "kas"],
-    "kazakh": ["kk", "kaz", "kaz", "kaz"],
-    "kikuyu": ["rw", "kin", "kin", "kin"],
-    "kirghiz": ["ky", "kir", "kir", "kir"],
-    "komi": ["kv", "kom", "kom", "kom"],
-    "kongo": ["kg", "kon", "kon", "kon"],
-    "korean": ["ko", "kor", "kor", "kor"],
-    "kuanyama": ["kj", "kua", "kua"],
-    "kurdish": ["ku", "kur", "kur", "kur"],
-    "lao": ["lo", "lao", "lao", "lao"],
-    "latin": ["la", "lat", "lat", "lat"],
-    "latvian": ["lv", "lav", "lav", "lav"],
-    "limburgan": ["li", "lim", "lim", "lim"],
-    "lingala": ["ln", "lin", "lin", "lin"],
-    "lithuanian": ["lt", "lit", "lit", "lit"],
-    "lubaKatanga": ["lu", "lub", "lub", "lub"],
-    "luxembourgish": ["lb", "ltz", "ltz", "ltz"],
-    "macedonian": ["mk", "mkd", "mac", "mkd"],
-    "malagasy": ["mg", "mlg", "mlg", "mlg"],
-    "malay": ["ms", "msa", "may", "msa"],
-    "malayalam": ["ml", "mal", "mal", "mal"],
-    "maltese": ["mt", "mlt", "mlt", "mlt"],
-    "manx": ["gv", "glv", "glv", "glv"],
-    "maori": ["mi", "mri", "mao", "mri"],
-    "marathi": ["mr", "mar", "mar", "mar"],
-    "marshallese": ["mh", "mah", "mah", "mah"],
-    "mongolian": ["mn", "mon", "mon", "mon"],
-    "nauru": ["na", "nau", "nau", "nau"],
-    "navajo": ["nv", "nav", "nav", "nav"],
-    "ndonga": ["ng", "ndo", "ndo", "ndo"],
-    "nepali": ["ne", "nep", "nep", "nep"],
-    "northernSami": ["se", "sme", "sme", "sme"],
-    "northNdebele": ["nd", "nde", "nde", "nde"],
-    "norwegian": ["no", "nor", "nor", "nor"],
-    "occitan": ["oc", "oci", "oci", "oci"],
-    "ojibwa": ["oj", "oji", "oji", "oji"],
-    "oriya": ["or", "ori", "ori", "ori"],
-    "oromo": ["om", "orm", "orm", "orm"],
-    "ossetian": ["os", "oss", "oss", "oss"],
-    "pali": ["pi", "pli", "pli", "pli"],
-    "pashto": ["ps", "pus", "pus", "pus"],
-    "persian": ["fa", "fas", "per", "fas"],
-    "polish": ["pl", "pol", "pol", "pol"],
-    "portuguese": ["pt", "por", "por", "por"],
-    "punjabi": ["pa", "pan", "pan", "pan"],
-    "quechua": ["qu", "que", "que", "que"],
-    "romanian": ["ro", "ron", "rum", "ron"],
-    "romansh": ["rm", "roh", "roh", "roh"],
-    "rundi": ["rn", "run", "run", "run"],
-    "russian": ["ru", "rus", "rus", "rus"],
-    "samoan": ["sm", "smo", "smo", "smo"],
-    "sango": ["sg", "sag", "sag", "sag"],
-    "sanskrit": ["sa", "san", "san", "san"],
-    "sardinian": ["sc", "srd", "srd", "srd"],
-    "serbian": ["sr", "srp", "srp", "srp"],
-    "shona": ["sn", "sna", "sna", "sna"],
-    "sichuanYi": ["ii", "iii", "iii", "iii"],
-    "sindhi": ["sd", "snd", "snd", "snd"],
-    "sinhala": ["si", "sin", "sin", "sin"],
-    "slovak": ["sk", "slk", "slo", "slk"],
-    "slovenian": ["sl", "slv", "slv", "slv"],
-    "somali": ["so", "som", "som", "som"],
-    "southernSotho": ["st", "sot", "sot", "sot"],
-    "southNdebele": ["nr", "nbl", "nbl", "nbl"],
-    "spanish": ["es", "spa", "spa", "spa"],
-    "sundanese": ["su", "sun", "sun", "sun"],
-    "swahili": ["sw", "swa", "swa", "swa"],
-    "swati": ["ss", "ssw", "ssw", "ssw"],
-    "swedish": ["sv", "swe", "swe", "swe"],
-    "tagalog": ["tl", "tgl", "tgl", "tgl"],
-    "tahitian": ["ty", "tah", "tah", "tah"],
-    "tajik": ["tg", "tgk", "tgk", "tgk"],
-    "tamil": ["ta", "tam", "tam", "tam"],
-    "tatar": ["tt", "tat", "tat", "tat"],
-    "telugu": ["te", "tel", "tel", "tel"],
-    "thai": ["th", "tha", "tha", "tha"],
-    "tibetan": ["bo", "bod", "tib", "bod"],
-    "tigrinya": ["ti", "tir", "tir", "tir"],
-    "tonga": ["to", "ton", "ton", "ton"],
-    "tsonga": ["ts", "tso", "tso", "tso"],
-    "tswana": ["tn", "tsn", "tsn", "tsn"],
-    "turkish": ["tr", "tur", "tur", "tur"],
-    "turkmen": ["tk", "tuk", "tuk", "tuk"],
-    "twi": ["tw", "twi", "twi", "twi"],
-    "uighur": ["ug", "uig", "uig", "uig"],
-    "ukrainian": ["uk", "ukr", "ukr", "ukr"],
-    "urdu": ["ur", "urd", "urd", "urd"],
-    "uzbek": ["uz", "uzb", "uzb", "uzb"],
-    "venda": ["ve", "ven", "ven", "ven"],
-    "vietnamese": ["vi", "vie", "vie", "vie"],
-    "volapuk": ["vo", "vol", "vol", "vol"],
-    "walloon": ["wa", "wln", "wln", "wln"],
-    "welsh": ["cy", "cym", "wel", "cym"],
-    "westernfrisian": ["fy", "fry", "fry", "fry"],
-    "wolof": ["wo", "wol", "wol", "wol"],
-    "xhosa": ["xh", "xho", "xho", "xho"],
-    "yiddish": ["yi", "yid", "yid", "yid"],
-    "yoruba": ["yo", "yor", "yor", "yor"],
-    "zhuang": ["za", "zha", "zha", "zha"],
-    "zulu": ["zu", "zul", "zul", "zul"],
+    "abkhazian": ("ab", "abk", "abk", "abk"),
+    "afar": ("aa", "aar", "aar", "aar"),
+    "afrikaans": ("af", "afr", "afr", "afr"),
+    "akan": ("ak", "aka", "aka", "aka"),
+    "albanian": ("sq", "sqi", "alb", "sqi"),
+    "amharic": ("am", "amh", "amh", "amh"),
+    "arabic": ("ar", "ara", "ara", "ara"),
+    "aragonese": ("an", "arg", "arg", "arg"),
+    "armenian": ("hy", "hye", "arm", "hye"),
+    "assamese": ("as", "asm", "asm", "asm"),
+    "avaric": ("av", "ava", "ava", "ava"),
+    "avestan": ("ae", "ave", "ave", "ave"),
+    "aymara": ("ay", "aym", "aym", "aym"),
+    "azerbaijani": ("az", "aze", "aze", "aze"),
+    "bambara": ("bm", "bam", "bam", "bam"),
+    "bashkir": ("ba", "bak", "bak", "bak"),
+    "basque": ("eu", "eus", "baq", "eus"),
+    "belarusian": ("be", "bel", "bel", "bel"),
+    "bengali": ("bn", "ben", "ben", "ben"),
+    "bislama": ("bi", "bis", "bis", "bis"),
+    "bosnian": ("bs", "bos", "bos", "bos"),
+    "breton": ("br", "bre", "bre", "bre"),
+    "bulgarian": ("bg", "bul", "bul", "bul"),
+    "burmese": ("my", "mya", "bur", "mya"),
+    "cambodian": ("K", "kuyu", "ki", "kik"),
+    "catalan": ("ca", "cat", "cat", "cat"),
+    "centralKhmer": ("km", "khm", "khm", "khm"),
+    "chamorro": ("ch", "cha", "cha", "cha"),
+    "chechen": ("ce", "che", "che", "che"),
+    "chichewa": ("ny", "nya", "nya", "nya"),
+    "chinese": ("zh", "zho", "chi", "zho"),
+    "churchSlavonic": ("cu", "chu", "chu", "chu"),
+    "chuvash": ("cv", "chv", "chv", "chv"),
+    "cornish": ("kw", "cor", "cor", "cor"),
+    "corsican": ("co", "cos", "cos", "cos"),
+    "cree": ("cr", "cre", "cre", "cre"),
+    "croatian": ("hr", "hrv", "hrv", "hrv"),
+    "czech": ("cs", "ces", "cze", "ces"),
+    "danish": ("da", "dan", "dan", "dan"),
+    "divehi": ("dv", "div", "div", "div"),
+    "dutch": ("nl", "nld", "dut", "nld"),
+    "dzongkha": ("dz", "dzo", "dzo", "dzo"),
+    "english": ("en", "eng", "eng", "eng"),
+    "esperanto": ("eo", "epo", "epo", "epo"),
+    "estonian": ("et", "est", "est", "est"),
+    "ewe": ("ee", "ewe", "ewe", "ewe"),
+    "faroese": ("fo", "fao", "fao", "fao"),
+    "fijian": ("fj", "fij", "fij", "fij"),
+    "finnish": ("fi", "fin", "fin", "fin"),
+    "french": ("fr", "fra", "fre", "fra"),
+    "fulah": ("ff", "ful", "ful", "ful"),
+    "gaelic": ("gd", "gla", "gla", "gla"),
+    "galician": ("gl", "glg", "glg", "glg"),
+    "ganda": ("lg", "lug", "lug", "lug"),
+    "georgian": ("ka", "kat", "geo", "kat"),
+    "german": ("de", "deu", "ger", "deu"),
+    "greek": ("el", "ell", "gre", "ell"),
+    "guarani": ("gn", "grn", "grn", "grn"),
+    "gujarati": ("gu", "guj", "guj", "guj"),
+    "haitian": ("ht", "hat", "hat", "hat"),
+    "hausa": ("ha", "hau", "hau", "hau"),
+    "hebrew": ("he", "heb", "heb", "heb"),
+    "herero": ("hz", "her", "her", "her"),
+    "hindi": ("hi", "hin", "hin", "hin"),
+    "hiriMotu": ("ho", "hmo", "hmo", "hmo"),
+    "hungarian": ("hu", "hun", "hun", "hun"),
+    "icelandic": ("is", "isl", "ice", "isl"),
+    "ido": ("io", "ido", "ido", "ido"),
+    "igbo": ("ig", "ibo", "ibo", "ibo"),
+    "indonesian": ("id", "ind", "ind", "ind"),
+    "interlingua": ("ia", "ina", "ina", "ina"),
+    "interlingue": ("ie", "ile", "ile", "ile"),
+    "inuktitut": ("iu", "iku", "iku", "iku"),
+    "inupiaq": ("ik", "ipk", "ipk", "ipk"),
+    "irish": ("ga", "gle", "gle", "gle"),
+    "italian": ("it", "ita", "ita", "ita"),
+    "japanese": ("ja", "jpn", "jpn", "jpn"),
+    "javanese": ("jv", "jav", "jav", "jav"),
+    "kalaallisut": ("kl", "kal", "kal", "kal"),
+    "kannada": ("kn", "kan", "kan", "kan"),
+    "kanuri": ("kr", "kau", "kau", "kau"),
+    "kashmiri": ("ks", "kas", "kas", "kas"),
+    "kazakh": ("kk", "kaz", "kaz", "kaz"),
+    "kikuyu": ("rw", "kin", "kin", "kin"),
+    "kirghiz": ("ky", "kir", "kir", "kir"),
+    "komi": ("kv", "kom", "kom", "kom"),
+    "kongo": ("kg", "kon", "kon", "kon"),
+    "korean": ("ko", "kor", "kor", "kor"),
+    "kuanyama": ("kj", "kua", "kua"),
+    "kurdish": ("ku", "kur", "kur", "kur"),
+    "lao": ("lo", "lao", "lao", "lao"),
+    "latin": ("la", "lat", "lat", "lat"),
+    "latvian": ("lv", "lav", "lav", "lav"),
+    "limburgan": ("li", "lim", "lim", "lim"),
+    "lingala": ("ln", "lin", "lin", "lin"),
+    "lithuanian": ("lt", "lit", "lit", "lit"),
+    "lubaKatanga": ("lu", "lub", "lub", "lub"),
+    "luxembourgish": ("lb", "ltz", "ltz", "ltz"),
+    "macedonian": ("mk", "mkd", "mac", "mkd"),
+    "malagasy": ("mg", "mlg", "mlg", "mlg"),
+    "malay": ("ms", "msa", "may", "msa"),
+    "malayalam": ("ml", "mal", "mal", "mal"),
+    "maltese": ("mt", "mlt", "mlt", "mlt"),
+    "manx": ("gv", "glv", "glv", "glv"),
+    "maori": ("mi", "mri", "mao", "mri"),
+    "marathi": ("mr", "mar", "mar", "mar"),
+    "marshallese": ("mh", "mah", "mah", "mah"),
+    "mongolian": ("mn", "mon", "mon", "mon"),
+    "nauru": ("na", "nau", "nau", "nau"),
+    "navajo": ("nv", "nav", "nav", "nav"),
+    "ndonga": ("ng", "ndo", "ndo", "ndo"),
+    "nepali": ("ne", "nep", "nep", "nep"),
+    "northernSami": ("se", "sme", "sme", "sme"),
+    "northNdebele": ("nd", "nde", "nde", "nde"),
+    "norwegian": ("no", "nor", "nor", "nor"),
+    "occitan": ("oc", "oci", "oci", "oci"),
+    "ojibwa": ("oj", "oji", "oji", "oji"),
+    "oriya": ("or", "ori", "ori", "ori"),
+    "oromo": ("om", "orm", "orm", "orm"),
+    "ossetian": ("os", "oss", "oss", "oss"),
+    "pali": ("pi", "pli", "pli", "pli"),
+    "pashto": ("ps", "pus", "pus", "pus"),
+    "persian": ("fa", "fas", "per", "fas"),
+    "polish": ("pl", "pol", "pol", "pol"),
+    "portuguese": ("pt", "por", "por", "por"),
+    "punjabi": ("pa", "pan", "pan", "pan"),
+    "quechua": ("qu", "que", "que", "que"),
+    "romanian": ("ro", "ron", "rum", "ron"),
+    "romansh": ("rm", "roh", "roh", "roh"),
+    "rundi": ("rn", "run", "run", "run"),
+    "russian": ("ru", "rus", "rus", "rus"),
+    "samoan": ("sm", "smo", "smo", "smo"),
+    "sango": ("sg", "sag", "sag", "sag"),
+    "sanskrit": ("sa", "san", "san", "san"),
+    "sardinian": ("sc", "srd", "srd", "srd"),
+    "serbian": ("sr", "srp", "srp", "srp"),
+    "shona": ("sn", "sna", "sna", "sna"),
+    "sichuanYi": ("ii", "iii", "iii", "iii"),
+    "sindhi": ("sd", "snd", "snd", "snd"),
+    "sinhala": ("si", "sin", "sin", "sin"),
+    "slovak": ("sk", "slk", "slo", "slk"),
+    "slovenian": ("sl", "slv", "slv", "slv"),
+    "somali": ("so", "som", "som", "som"),
+    "southernSotho": ("st", "sot", "sot", "sot"),
+    "southNdebele": ("nr", "nbl", "nbl", "nbl"),
+    "spanish": ("es", "spa", "spa", "spa"),
+    "sundanese": ("su", "sun", "sun", "sun"),
+    "swahili": ("sw", "swa", "swa", "swa"),
+    "swati": ("ss", "ssw", "ssw", "ssw"),
+    "swedish": ("sv", "swe", "swe", "swe"),
+    "tagalog": ("tl", "tgl", "tgl", "tgl"),
+    "tahitian": ("ty", "tah", "tah", "tah"),
+    "tajik": ("tg", "tgk", "tgk", "tgk"),
+    "tamil": ("ta", "tam", "tam", "tam"),
+    "tatar": ("tt", "tat", "tat", "tat"),
+    "telugu": ("te", "tel", "tel", "tel"),
+    "thai": ("th", "tha", "tha", "tha"),
+    "tibetan": ("bo", "bod", "tib", "bod"),
+    "tigrinya": ("ti", "tir", "tir", "tir"),
+    "tonga": ("to", "ton", "ton", "ton"),
+    "tsonga": ("ts", "tso", "tso", "tso"),
+    "tswana": ("tn", "tsn", "tsn", "tsn"),
+    "turkish": ("tr", "tur", "tur", "tur"),
+    "turkmen": ("tk", "tuk", "tuk", "tuk"),
+    "twi": ("tw", "twi", "twi", "twi"),
+    "uighur": ("ug", "uig", "uig", "uig"),
+    "ukrainian": ("uk", "ukr", "ukr", "ukr"),
+    "urdu": ("ur", "urd", "urd", "urd"),
+    "uzbek": ("uz", "uzb", "uzb", "uzb"),
+    "venda": ("ve", "ven", "ven", "ven"),
+    "vietnamese": ("vi", "vie", "vie", "vie"),
+    "volapuk": ("vo", "vol", "vol", "vol"),
+    "walloon": ("wa", "wln", "wln", "wln"),
+    "welsh": ("cy", "cym", "wel", "cym"),
+    "westernfrisian": ("fy", "fry", "fry", "fry"),
+    "wolof": ("wo", "wol", "wol", "wol"),
+    "xhosa": ("xh", "xho", "xho", "xho"),
+    "yiddish": ("yi", "yid", "yid", "yid"),
+    "yoruba": ("yo", "yor", "yor", "yor"),
+    "zhuang": ("za", "zha", "zha", "zha"),
+    "zulu": ("zu", "zul", "zul", "zul"),
+}
+
+# reverse lookup from iso639 code to language, the first language listing a code wins
+CODE_TO_LANGUAGE: Dict[str, str] = {
+    code: language for language, codes in reversed(LANGUAGES.items()) for code in codes
 }
 
+# language names grouped by length, in LANGUAGES order
+LANGUAGES_BY_LENGTH: Dict[int, List[str]] = {}
+for language in LANGUAGES:
+    LANGUAGES_BY_LENGTH.setdefault(len(language), []).append(language)
+
+# cleaned subtitle name -> (language, is sdh), the same names repeat for every episode
+sub_language_cache: Dict[str, Tuple[Optional[str], bool]] = {}
+
+
+def detect_sub_language(sub_name: str) -> Tuple[Optional[str], bool]:
+    min_dist = 1000000
+    min_lang = None
+    found = False
+
+    if len(sub_name) < 2:
+        min_lang = "english"
+        found = True
+
+    parts = sub_name.split(" ")
+
+    is_sdh = False
+
+    if not found:
+        for part in parts:
+            if part == "sdh":
+                is_sdh = True
+                continue
+
+            if len(part) < 2:
+                continue
+
+            if part in CODE_TO_LANGUAGE:
+                min_lang = CODE_TO_LANGUAGE[part]
+                found = True
+
+            if found:
+                break
+
+            # exact name, same as a distance of 0 below. keeps going like the fuzzy
+            # match does, so a trailing "sdh" is still picked up
+            if part in LANGUAGES:
+                min_lang = part
+                found = True
+                continue
+
+            # insertions cost 1 and anything else at least 20, so only languages
+            # up to 10 chars longer than the part can get under the cutoff
+            for length in range(len(part), len(part) + 11):
+                for lang in LANGUAGES_BY_LENGTH.get(length, []):
+                    dist = Levenshtein.distance(
+                        part, lang, weights=(1, 20, 100), score_cutoff=10
+                    )
+                    if dist > 10:
+                        continue
+
+                    if dist < min_dist:
+                        min_dist = dist
+                        min_lang = lang
+                        found = True
+
+    return min_lang, is_sdh
+
+
+def move_file(src: str, dst: str):
+    # a plain rename when possible, shutil copies when it has to cross devices
+    # (other filesystems, but also bind mounts of the same one)
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+        shutil.move(src, dst)
+
 
 def handle_signal(signum, _):
-    print(f"Got signal {signum}, writing caches and exiting..")
-    write_caches()
+    print(f"Got signal {signum}, exiting..")
     sys.exit(0)
 
 
@@ -1010,8 +1345,6 @@ if __name__ == "__main__":
     signal.signal(signal.SIGTERM, handle_signal)
     signal.signal(signal.SIGHUP, handle_signal)
 
-    atexit.register(write_caches)
-
     if auth_key is None or auth_key == "":
         print(
             "No TMDB API key found. Provide one by setting the TMDB_API_KEY environment variable or by creating a file named .tmdb-api-key in the process working directory. You may change the location of the file by setting the TMDB_API_KEY_FILE environment variable."
@@ -1084,7 +1417,7 @@ if __name__ == "__main__":
         sys.exit(1)
 
     if not no_caches:
-        load_caches()
+        open_caches()
 
     query_all_genres()
 
@@ -1092,85 +1425,126 @@ if __name__ == "__main__":
 
     discovered = 0
 
-    for root, _, files in os.walk(abspath):
-        for file in files:
-            discovered += 1
+    # entry paths are abspath joined with the relative path, slice that prefix off
+    abs_prefix_len = len(abspath) + 1
 
-            if discovered % 100 == 0:
-                print(f"Discovered {discovered} files...")
+    walked: List[os.DirEntry] = []
+    subs_by_dir: DefaultDict[str, List[str]] = defaultdict(list)
 
-            full_show_path = f"{root}/{file}"
-            show_path = full_show_path[len(abspath) + 1 :]
+    # one walk for everything, subtitles are listed under their own directory and
+    # every directory above it, so a video picks up the ones in subdirs as well
+    for entry in iter_files(abspath):
+        walked.append(entry)
 
-            show = parse_show_or_movie_path(
-                Path(show_path),
-                MediaType.SHOW if media_type == "show" else MediaType.MOVIE,
-            )
+        if not entry.name.endswith(SUBTITLE_EXTENSIONS):
+            continue
 
-            if show is None:
-                continue
+        sub_path = entry.path[abs_prefix_len:]
 
-            if show.resolution is None:
-                widthheight = ffprobe_width_and_height(Path(full_show_path))
-                show.resolution = get_resolution_from_ffprobe(widthheight)
-
-            dir = Path(full_show_path).parent
-
-            # the greateest code evewr
-            for root2, _, files in os.walk(dir):
-                for file in files:
-                    if (
-                        file.endswith(".srt")
-                        or file.endswith(".vtt")
-                        or file.endswith(".ass")
-                        or file.endswith(".mks")
-                    ):
-                        show.subtitle_paths.append(
-                            f"{root2}/{file}"[len(abspath) + 1 :]
-                        )
-
-            # if there are multiple subs, and some of them match the name,
-            # there was probably a dir with all of them, so then filter them
-            # down to the ones with matching episode/season
-            if len(show.subtitle_paths) > 1:
-                matches_name = False
-                for sub in show.subtitle_paths:
-                    if sub.find(show.title) or (
-                        show.name is not None and sub.find(show.name)
-                    ):
-                        matches_name = True
-                        break
-
-                old_subs = show.subtitle_paths[:]
-                for sub in old_subs:
-                    season = f"S{show.season:02d}" if show.season is not None else None
-                    episode = (
-                        f"E{show.episode:02d}" if show.episode is not None else None
-                    )
+        dir = os.path.dirname(entry.path)
+        while True:
+            subs_by_dir[dir].append(sub_path)
 
-                    season_episode = ""
-                    if season is not None:
-                        season_episode += season
+            if len(dir) < abs_prefix_len:
+                break
 
-                    if episode is not None:
-                        season_episode += episode
+            dir = os.path.dirname(dir)
 
-                    if (
-                        sub.find(season_episode) != -1
-                        or sub.find(season_episode.lower()) != -1
-                    ):
-                        show.subtitle_paths = [sub]
-                        break
+    for entry in walked:
+        discovered += 1
 
-            shows.append(show)
+        if discovered % 100 == 0:
+            print(f"Discovered {discovered} files...")
+
+        full_show_path = entry.path
+        show_path = full_show_path[abs_prefix_len:]
+
+        show = parse_show_or_movie_path(
+            Path(show_path),
+            MediaType.SHOW if media_type == "show" else MediaType.MOVIE,
+        )
+
+        if show is None:
+            continue
+
+        show.subtitle_paths = list(subs_by_dir.get(os.path.dirname(full_show_path), []))
+
+        # if there are multiple subs, and some of them match the name,
+        # there was probably a dir with all of them, so then filter them
+        # down to the ones with matching episode/season. without either there is
+        # nothing to match on, "" is in every name and would just keep the first one
+        if len(show.subtitle_paths) > 1 and (
+            show.season is not None or show.episode is not None
+        ):
+            season_episode = ""
+            if show.season is not None:
+                season_episode += f"S{show.season:02d}"
+
+            if show.episode is not None:
+                season_episode += f"E{show.episode:02d}"
+
+            se_lower = season_episode.lower()
+
+            old_subs = show.subtitle_paths[:]
+            for sub in old_subs:
+                if season_episode in sub or se_lower in sub:
+                    show.subtitle_paths = [sub]
+                    break
+
+        shows.append(show)
 
     print(f"Discovered {discovered} files")
 
-    new_paths: Dict[str, Show] = {}
+    # the path usually has the resolution already, only probe the files without it.
+    # tmdb doesn't need the resolution, so the probes run in the background while
+    # it is queried, and are collected right before the new paths are built
+    needs_probe = [show for show in shows if show.resolution is None]
+    probe_executor: Optional[ThreadPoolExecutor] = None
+
+    if len(needs_probe) > 0:
+        print(f"Probing {len(needs_probe)} files for resolution...")
+
+        probe_workers = min(32, (os.cpu_count() or 1) * 4)
+        probe_executor = ThreadPoolExecutor(max_workers=probe_workers)
+        widthheights = probe_executor.map(
+            lambda show: probe_width_and_height(Path(abspath) / show.fullpath),
+            needs_probe,
+        )
+
+    new_paths: List[Tuple[str, Show]] = []
+
+    print("Querying TMDB for titles...")
+
+    titles: Dict[TitleKey, Show] = {}
+    for show in shows:
+        if show.title is not None:
+            titles.setdefault((canonical_title(show.title), show.year), show)
+
+    if media_type == "show":
+        bulk_query_shows((show.title, show.year) for show in titles.values())
+    else:
+        bulk_query_movies((show.title, show.year) for show in titles.values())
+
+    # picking between multiple results can prompt, so ids are resolved on this thread
+    for show in titles.values():
+        query_tmdb_id(show)
 
     print("Querying TMDB for details...")
+
+    bulk_query_details(shows)
+
+    if probe_executor is not None:
+        for show, widthheight in zip(needs_probe, widthheights):
+            show.resolution = get_resolution_from_ffprobe(widthheight)
+
+        probe_executor.shutdown()
+
     queried = 0
 
+    # every episode of a season shares the same details, look them up and index
+    # the episodes once per season instead of once per file
+    seasons: Dict[Tuple, Tuple[dict, Dict[int, object]]] = {}
+
     for show in shows:
         queried += 1
 
@@ -1178,21 +1552,25 @@ if __name__ == "__main__":
             print(f"Queried {queried} files...")
 
         if media_type == "show":
-            tmdb_details = query_tmdb_details(show)
+            season_key = (show.title, show.year, show.season)
 
-            if tmdb_details is None:
-                tmdb_details = {}
+            if season_key not in seasons:
+                tmdb_details = query_tmdb_details(show)
+
+                if tmdb_details is None:
+                    tmdb_details = {}
 
-            if "episodes" in tmdb_details:
-                episodes = tmdb_details["episodes"]
+                episodes: Dict[int, object] = {}
+                for episode in tmdb_details.get("episodes", []):
+                    if "episode_number" in episode:
+                        episodes.setdefault(episode["episode_number"], episode)
 
-                for episode in episodes:
-                    if (
-                        "episode_number" in episode
-                        and episode["episode_number"] == show.episode
-                    ):
-                        show.name = episode["name"]
-                        break
+                seasons[season_key] = tmdb_details, episodes
+
+            tmdb_details, episodes = seasons[season_key]
+
+            if show.episode in episodes:
+                show.name = episodes[show.episode]["name"]
 
             if show.year is None:
                 if "first_air_date" in tmdb_details:
@@ -1253,7 +1631,7 @@ if __name__ == "__main__":
 
                 new_path += f"/{show.name}.{show.extension}"
 
-            new_paths[new_path] = show
+            new_paths.append((new_path, show))
 
         else:
             tmdb_details = query_tmdb_details(show)
@@ -1279,72 +1657,36 @@ if __name__ == "__main__":
 
             new_path += f"/{show.title} - [{show.resolution}].{show.extension}"
 
-            new_paths[new_path] = show
+            new_paths.append((new_path, show))
 
     print(f"Queried {queried} files")
 
     def process_sub_names(show: Show, new_video_name: str) -> List[str]:
-        global remove_parts
-
         new_subs = []
 
-        lang_keys = list(LANGUAGES.keys())
+        show_stem = Path(show.fullpath).stem
+        show_stem_lower = show_stem.lower()
 
         for sub in show.subtitle_paths:
-            sub_ext = Path(sub).suffix[1:]
-            sub_name = Path(sub).stem
-
-            if Path(show.fullpath).stem in sub_name:
-                sub_name = re.compile(
-                    re.escape(Path(show.fullpath).stem), re.IGNORECASE
-                ).sub("", sub_name)
-
-            sub_name = re.compile(r"[.\-_,;:]").sub(" ", sub_name).lower()
-
-            for disallowed in remove_parts:
-                sub_name = re.compile(r"\b" + disallowed + r"\b", re.IGNORECASE).sub(
-                    "", sub_name
-                )
-
-            min_dist = 1000000
-            min_lang = None
-            found = False
-
-            if len(sub_name) < 2:
-                min_lang = "english"
-                found = True
-
-            parts = sub_name.split(" ")
-
-            is_sdh = False
-
-            if not found:
-                for part in parts:
-                    if part == "sdh":
-                        is_sdh = True
-                        continue
-
-                    if len(part) < 2:
-                        continue
+            p = Path(sub)
+            sub_ext = p.suffix[1:]
+            sub_name = p.stem
 
-                    for lang, codes in LANGUAGES.items():
-                        if part in codes:
-                            min_lang = lang
-                            found = True
-                            break
+            # the name is lowercased anyway, so a plain replace does the case
+            # insensitive removal
+            if show_stem in sub_name:
+                sub_name = sub_name.lower().replace(show_stem_lower, "")
 
-                    if found:
-                        break
+            sub_name = sub_name.translate(sub_separators_table).lower()
 
-                    for lang in lang_keys:
-                        dist = Levenshtein.distance(part, lang, weights=(1, 20, 100))
-                        if dist > 10:
-                            continue
+            if re_remove_sub_parts is not None:
+                sub_name = re_remove_sub_parts.sub("", sub_name)
 
-                        if dist < min_dist:
-                            min_dist = dist
-                            min_lang = lang
-                            found = True
+            if sub_name in sub_language_cache:
+                min_lang, is_sdh = sub_language_cache[sub_name]
+            else:
+                min_lang, is_sdh = detect_sub_language(sub_name)
+                sub_language_cache[sub_name] = min_lang, is_sdh
 
             new_sub_name = f"{new_video_name}."
 
@@ -1366,63 +1708,92 @@ if __name__ == "__main__":
 
         return new_subs
 
-    from pprint import pprint
-
-    f = open("output.txt", "w")
+    # one large buffer, the log is only read after the run
+    log_f = open("output.txt", "w", buffering=1 << 20)
 
     renamed = 0
 
-    for new_path, show in new_paths.items():
-        renamed += 1
+    # two files can end up with the same new path (e.g. duplicate episodes),
+    # moving both would overwrite the first one so skip and report those
+    taken_paths: Set[str] = set()
 
-        if renamed % 100 == 0:
-            print(f"Renamed {renamed} files...")
+    try:
+        for new_path, show in new_paths:
+            new_path = new_path.translate(illegal_path_chars_table)
 
-        new_path = re.compile(r"[\:*?\"<>|]").sub("", new_path)
+            if new_path in taken_paths:
+                print(
+                    f"Duplicate path {new_path} for {show.fullpath}, skipping",
+                    file=sys.stderr,
+                )
+                continue
 
-        path = out_abspath / Path(new_path)
-        dir = path.parent
+            taken_paths.add(new_path)
 
-        new_video_name = path.stem
+            renamed += 1
 
-        os.makedirs(dir, exist_ok=True)
+            if renamed % 100 == 0:
+                print(f"Renamed {renamed} files...")
 
-        subs = process_sub_names(show, new_video_name)
+            path = out_abspath / Path(new_path)
+            dir = path.parent
 
-        if dry_run:
-            newpath = Path(path).with_suffix(f".{show.extension}.txt")
-            with open(newpath, "w") as f:
-                f.write(f"fullpath: {show.fullpath}\n")
-                f.write(f"newpath: {new_path}\n")
-                pprint(show, stream=f)
+            new_video_name = path.stem
 
-            for i, sub in enumerate(subs):
-                subpath = Path(newpath).parent / sub
-                subpath = Path(str(subpath) + ".txt")
+            os.makedirs(dir, exist_ok=True)
 
-                with open(subpath, "w") as f:
-                    f.write(f"fullpath: {show.subtitle_paths[i]}\n")
-                    f.write(f"newpath: {sub}\n")
-        else:
-            show_abspath = Path(abspath) / Path(show.fullpath)
-            show_newpath = Path(path).with_suffix(f".{show.extension}")
+            # subs that get the same new name would overwrite each other, the first
+            # one is kept in place of the rest
+            subs: List[Tuple[str, str]] = []
+            taken_subs: Set[str] = set()
+            for sub_path, sub in zip(
+                show.subtitle_paths, process_sub_names(show, new_video_name)
+            ):
+                if sub in taken_subs:
+                    print(
+                        f"Duplicate subtitle {sub} for {sub_path}, skipping",
+                        file=sys.stderr,
+                    )
+                    continue
+
+                taken_subs.add(sub)
+                subs.append((sub_path, sub))
 
-            print("  ", show_abspath, file=f)
-            print("->", show_newpath, file=f)
-            shutil.move(show_abspath, show_newpath)
+            if dry_run:
+                newpath = Path(path).with_suffix(f".{show.extension}.txt")
+                with open(newpath, "w") as f:
+                    f.write(f"fullpath: {show.fullpath}\n")
+                    f.write(f"newpath: {new_path}\n")
+                    f.write(f"{show!r}\n")
 
-            for i, sub in enumerate(subs):
-                sub_abspath = Path(abspath) / Path(show.subtitle_paths[i])
-                sub_newpath = Path(dir) / Path(sub)
+                for sub_path, sub in subs:
+                    subpath = Path(newpath).parent / sub
+                    subpath = Path(str(subpath) + ".txt")
 
-                print("  ", sub_abspath, file=f)
-                print("->", sub_newpath, file=f)
-                shutil.move(sub_abspath, sub_newpath)
+                    with open(subpath, "w") as f:
+                        f.write(f"fullpath: {sub_path}\n")
+                        f.write(f"newpath: {sub}\n")
+            else:
+                show_abspath = Path(abspath) / Path(show.fullpath)
+                show_newpath = Path(path).with_suffix(f".{show.extension}")
 
-            print("", file=f)
+                moves = [(str(show_abspath), str(show_newpath))]
 
-    print(f"Renamed {renamed} files")
+                for sub_path, sub in subs:
+                    sub_abspath = Path(abspath) / Path(sub_path)
+                    sub_newpath = Path(dir) / Path(sub)
 
-    f.close()
+                    moves.append((str(sub_abspath), str(sub_newpath)))
+
+                # logged after each move, so a failed one doesn't show up as done
+                for src, dst in moves:
+                    move_file(src, dst)
+                    log_f.write(f"   {src}\n-> {dst}\n")
+
+                log_f.write("\n")
+    finally:
+        log_f.close()
+
+    print(f"Renamed {renamed} files")
 
     print("Done")